@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+backtest.py - 偵測策略離線回測
+
+功能：
+    - 讀取 stats.csv（collector.py 或 traffic_gen.py 產生）
+    - 以向量化方式重現 detector.detector_loop() 的判斷邏輯
+      （門檻 + 連續 N 秒才觸發，持續期間只觸發一次）
+    - 以 process pool 掃描門檻 / 連續秒數 / 是否啟用 AI 的組合
+    - 每個策略回報：偵測延遲、漏報事件數、誤報次數、下發的 flow 數
+
+使用方式：
+    python3 backtest.py stats.csv
+    python3 backtest.py gen_stats.csv --arp 10,20,50,100 --arp-consec 1,2,3 --ai --out result.csv
+
+label 定義：0 正常、1 ARP Flood、2 MAC Flood（與 traffic_gen.py 相同）
+"""
+
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# ---------------- 基本設定 ----------------
+
+AI_MODEL_PATH = "ai_model.pkl"
+AI_FEATURES = ["total_pkts", "arp_pkts", "unique_src_macs", "arp_ratio"]
+
+# 預設掃描範圍
+DEFAULT_ARP_THRESHOLDS = [10, 20, 30, 50, 75, 100, 150]
+DEFAULT_ARP_CONSEC = [1, 2, 3, 4, 5]
+DEFAULT_MAC_THRESHOLDS = [5, 10, 20, 50]
+DEFAULT_MAC_CONSEC = [1, 2, 3]
+
+LABEL_ARP = 1
+LABEL_MAC = 2
+
+RESULT_COLUMNS = [
+    "threshold_arp", "arp_consec", "threshold_mac", "mac_consec", "use_ai",
+    "arp_events", "arp_detected", "arp_delay_mean_s", "arp_delay_max_s", "arp_false_pos",
+    "mac_events", "mac_detected", "mac_delay_mean_s", "mac_delay_max_s", "mac_false_pos",
+    "flows_installed",
+]
+
+# worker 共用資料（由 _init_worker 設定，避免每個任務重新傳送整份資料）
+_data = None
+
+
+# ---------------- 資料準備 ----------------
+
+def load_history(path):
+    """讀取 stats.csv，回傳回測所需的 numpy 陣列"""
+    df = pd.read_csv(path)
+    # 與 detector 相同：collector 標記為 gap 的視窗直接略過
+    if "capture_status" not in df:
+        df["capture_status"] = "ok"
+    df = df[df["capture_status"] != "gap"]
+    df = df.sort_values("timestamp_epoch", kind="stable").reset_index(drop=True)
+
+    total = df["total_pkts"].to_numpy(dtype=np.int64)
+    arp = df["arp_pkts"].to_numpy(dtype=np.int64)
+    # 與 detector.py 相同，arp_ratio 以原始數值重新計算
+    df["arp_ratio"] = np.divide(arp, total, out=np.zeros(len(df)), where=total > 0)
+
+    return {
+        "ts": df["timestamp_epoch"].to_numpy(dtype=np.int64),
+        "total_pkts": total,
+        "arp_pkts": arp,
+        "unique_src_macs": df["unique_src_macs"].to_numpy(dtype=np.int64),
+        "label": df["label"].to_numpy(dtype=np.int64) if "label" in df else np.zeros(len(df), dtype=np.int64),
+        # partial 視窗資料不完整，detector 不會因此歸零連續計數
+        "partial": (df["capture_status"] == "partial").to_numpy(),
+        "features": df[AI_FEATURES],
+    }
+
+
+def ai_predictions(data, model_path=AI_MODEL_PATH):
+    """整段歷史一次批次推論；模型載入失敗則回傳 None"""
+    try:
+        import joblib
+        model = joblib.load(model_path)
+        return np.asarray(model.predict(data["features"])) == 1
+    except Exception as e:
+        print(f"[backtest] AI model load/predict failed: {e}")
+        return None
+
+
+# ---------------- 向量化偵測邏輯 ----------------
+
+def run_lengths(high, hold=None):
+    """
+    每個位置目前連續為 True 的次數
+
+    未超標的視窗會歸零，但 hold 為 True 的視窗（partial）維持原計數，
+    與 detector_loop 的行為相同
+    """
+    high = np.asarray(high, dtype=bool)
+    reset = ~high if hold is None else ~high & ~hold
+    highs = np.cumsum(high)
+    last_reset = np.maximum.accumulate(np.where(reset, highs, 0))
+    return np.where(high, highs - last_reset, 0)
+
+
+def triggers(high, consec, hold=None):
+    """
+    detector_loop 的觸發點：
+        連續第 consec 次超標時觸發，之後到下一次歸零前不再觸發
+    """
+    return np.flatnonzero(run_lengths(high, hold) == consec)
+
+
+def episodes(mask):
+    """回傳 (starts, ends) 左閉右開；每段連續 True 視為一次攻擊事件"""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    diff = np.diff(padded)
+    return np.flatnonzero(diff == 1), np.flatnonzero(diff == -1)
+
+
+def score(trigger_idx, truth, ts):
+    """計算事件偵測數、延遲（秒）與誤報次數"""
+    starts, ends = episodes(truth)
+    # 每個事件開始之後的第一個觸發點
+    pos = np.searchsorted(trigger_idx, starts)
+    valid = pos < len(trigger_idx)
+    first = np.zeros(len(starts), dtype=np.int64)
+    first[valid] = trigger_idx[pos[valid]]
+    hit = valid & (first < ends)
+    delays = ts[first[hit]] - ts[starts[hit]]
+
+    return {
+        "events": int(len(starts)),
+        "detected": int(hit.sum()),
+        "delay_mean_s": round(float(delays.mean()), 3) if len(delays) else None,
+        "delay_max_s": int(delays.max()) if len(delays) else None,
+        "false_pos": int((~truth[trigger_idx]).sum()),
+    }
+
+
+def evaluate(data, threshold_arp, arp_consec, threshold_mac, mac_consec, use_ai):
+    """回測單一策略"""
+    ts = data["ts"]
+
+    arp_high = data["arp_pkts"] > threshold_arp
+    if use_ai and data.get("ai_pred") is not None:
+        arp_high = arp_high | data["ai_pred"]
+    mac_high = data["unique_src_macs"] > threshold_mac
+
+    hold = data.get("partial")
+    arp_trig = triggers(arp_high, arp_consec, hold)
+    mac_trig = triggers(mac_high, mac_consec, hold)
+
+    arp_score = score(arp_trig, data["label"] == LABEL_ARP, ts)
+    mac_score = score(mac_trig, data["label"] == LABEL_MAC, ts)
+
+    # block 模式下每次觸發會對該秒所有來源 MAC 下 drop flow；
+    # stats.csv 只有 MAC 數量沒有清單，因此為不去重的上限值
+    fired = np.union1d(arp_trig, mac_trig)
+    flows = int(data["unique_src_macs"][fired].sum())
+
+    result = {
+        "threshold_arp": threshold_arp,
+        "arp_consec": arp_consec,
+        "threshold_mac": threshold_mac,
+        "mac_consec": mac_consec,
+        "use_ai": use_ai,
+        "flows_installed": flows,
+    }
+    for key, value in arp_score.items():
+        result[f"arp_{key}"] = value
+    for key, value in mac_score.items():
+        result[f"mac_{key}"] = value
+    return result
+
+
+# ---------------- 平行掃描 ----------------
+
+def _init_worker(data):
+    global _data
+    _data = data
+
+
+def _evaluate_policy(policy):
+    return evaluate(_data, *policy)
+
+
+def sweep(data, arp_thresholds, arp_consecs, mac_thresholds, mac_consecs,
+          ai_options=(False,), workers=None):
+    """以 process pool 回測所有策略組合，回傳 DataFrame"""
+    data = {k: v for k, v in data.items() if k != "features"}
+    policies = list(itertools.product(
+        arp_thresholds, arp_consecs, mac_thresholds, mac_consecs, ai_options
+    ))
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(policies) // (workers * 4))
+
+    if workers == 1:
+        results = [evaluate(data, *p) for p in policies]
+    else:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=(data,)) as pool:
+            results = list(pool.map(_evaluate_policy, policies, chunksize=chunksize))
+
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+
+def parse_int_list(text):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="偵測策略離線回測")
+    parser.add_argument("csv", nargs="?", default="stats.csv")
+    parser.add_argument("--arp", type=parse_int_list, default=DEFAULT_ARP_THRESHOLDS)
+    parser.add_argument("--arp-consec", type=parse_int_list, default=DEFAULT_ARP_CONSEC)
+    parser.add_argument("--mac", type=parse_int_list, default=DEFAULT_MAC_THRESHOLDS)
+    parser.add_argument("--mac-consec", type=parse_int_list, default=DEFAULT_MAC_CONSEC)
+    parser.add_argument("--ai", action="store_true", help="同時比較 Rule-only 與 Rule + AI")
+    parser.add_argument("--model", default=AI_MODEL_PATH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", default=None, help="完整結果輸出 CSV 路徑")
+    args = parser.parse_args()
+
+    data = load_history(args.csv)
+    print(f">>> 載入 {args.csv}: {len(data['ts'])} windows")
+
+    ai_options = (False,)
+    if args.ai:
+        data["ai_pred"] = ai_predictions(data, args.model)
+        if data["ai_pred"] is not None:
+            ai_options = (False, True)
+
+    result = sweep(data, args.arp, args.arp_consec, args.mac, args.mac_consec,
+                   ai_options, args.workers)
+
+    # 排序：漏報少 > 誤報少 > 延遲短 > flow 少
+    result["_missed"] = (result["arp_events"] - result["arp_detected"]
+                         + result["mac_events"] - result["mac_detected"])
+    result["_fp"] = result["arp_false_pos"] + result["mac_false_pos"]
+    result = result.sort_values(
+        ["_missed", "_fp", "arp_delay_mean_s", "mac_delay_mean_s", "flows_installed"],
+        na_position="last",
+    ).drop(columns=["_missed", "_fp"])
+
+    print(f">>> 回測 {len(result)} 種策略")
+    print(result.head(args.top).to_string(index=False))
+
+    if args.out:
+        result.to_csv(args.out, index=False)
+        print(f"✅ {args.out}")
+
+
+if __name__ == "__main__":
+    main()
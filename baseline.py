@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+baseline.py - 自適應串流基準線（EWMA）異常偵測
+
+功能：
+    - 對每個 (switch, port) 的視窗特徵維護 EWMA 平均值與變異數
+    - 以 z-score 判斷是否明顯高於基準線（僅偵測向上偏離）
+    - 可選 seasonal 模式：依一天中的時段分槽各自維護基準線
+    - 每個 key 的狀態為常數大小，每個視窗的更新為 O(1)
+
+每個特徵各自決定如何學習：正常視窗以 EWMA_ALPHA 更新；被判定為異常的
+特徵改以 FLAGGED_ALPHA 更新，且輸入值截斷在 mean + Z_THRESHOLD * std，
+短暫攻擊對基準線影響有限，長期的水準變化（例如新增主機）仍會被吸收。
+"""
+
+import math
+import time
+
+# ---------------- 基本設定 ----------------
+
+EWMA_ALPHA = 0.05        # 約等於最近 20 秒的視窗權重
+Z_THRESHOLD = 4.0
+FLAGGED_ALPHA = 0.01     # 異常視窗仍以較低權重學習，持續的水準變化會逐漸被吸收
+WARMUP_WINDOWS = 30      # 累積足夠視窗前不判斷
+MIN_STD = {              # 避免安靜網路上 std≈0 導致一點流量就觸發
+    "arp_pkts": 3.0,
+    "unique_src_macs": 2.0,
+    "total_pkts": 10.0,
+}
+SEASON_SLOTS = 0         # 0 = 停用；24 = 每小時一組基準線
+FEATURES = ["total_pkts", "arp_pkts", "unique_src_macs"]
+
+AGGREGATE_PORT = "*"
+
+
+class EwmaStat:
+    """單一特徵的 EWMA 平均值 / 變異數"""
+
+    __slots__ = ("mean", "var", "count")
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def std(self, min_std):
+        return max(math.sqrt(self.var), min_std)
+
+    def zscore(self, x, min_std):
+        return (x - self.mean) / self.std(min_std)
+
+    def update(self, x, alpha):
+        self.count += 1
+        if self.count == 1:
+            self.mean = float(x)
+            self.var = 0.0
+            return
+        # 預熱期間用 1/n 權重，讓初始平均值不受第一個視窗主導
+        a = max(alpha, 1.0 / self.count)
+        diff = x - self.mean
+        incr = a * diff
+        self.mean += incr
+        self.var = (1 - a) * (self.var + diff * incr)
+
+
+class BaselineDetector:
+    """
+    依 (switch, port[, season slot]) 維護基準線
+
+    observe() 回傳本視窗被判定異常的特徵，例如：
+        {"arp_pkts": [("s1", "s1-eth3", 12.4)]}
+    """
+
+    def __init__(self, alpha=EWMA_ALPHA, z_threshold=Z_THRESHOLD,
+                 warmup=WARMUP_WINDOWS, season_slots=SEASON_SLOTS,
+                 features=FEATURES, min_std=MIN_STD, flagged_alpha=FLAGGED_ALPHA):
+        self.alpha = alpha
+        self.flagged_alpha = flagged_alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.season_slots = season_slots
+        self.features = list(features)
+        self.min_std = dict(min_std)
+        self.state = {}
+
+    def _slot(self, ts):
+        if not self.season_slots:
+            return 0
+        t = time.localtime(ts)
+        seconds = t.tm_hour * 3600 + t.tm_min * 60 + t.tm_sec
+        return seconds * self.season_slots // 86400
+
+    def _stats_for(self, key):
+        stats = self.state.get(key)
+        if stats is None:
+            stats = {f: EwmaStat() for f in self.features}
+            self.state[key] = stats
+        return stats
+
+    def check(self, key, window, learn=True):
+        """
+        對單一 key 的視窗計算 z-score 並更新基準線；回傳異常特徵 -> z
+
+        learn=False 時只判斷不更新（例如抓包不完整的視窗）
+        """
+        stats = self._stats_for(key)
+        flagged = {}
+        for f in self.features:
+            st = stats[f]
+            x = window.get(f, 0)
+            min_std = self.min_std.get(f, 1.0)
+            alpha = self.alpha
+
+            if st.count >= self.warmup:
+                z = st.zscore(x, min_std)
+                if z > self.z_threshold:
+                    flagged[f] = z
+                    alpha = self.flagged_alpha
+                    x = st.mean + self.z_threshold * st.std(min_std)
+
+            if learn:
+                st.update(x, alpha)
+        return flagged
+
+    def observe(self, switch, stats, learn=True):
+        """
+        處理一筆 stats.json：整體視窗 + stats["ports"] 中每個 port 的視窗
+        """
+        slot = self._slot(stats.get("timestamp_epoch") or time.time())
+        windows = [(AGGREGATE_PORT, stats)]
+        windows += sorted(stats.get("ports", {}).items())
+
+        anomalies = {}
+        for port, window in windows:
+            for f, z in self.check((switch, port, slot), window, learn).items():
+                anomalies.setdefault(f, []).append((switch, port, round(z, 2)))
+        return anomalies
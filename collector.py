@@ -3,6 +3,11 @@
 collector.py - 封包收集器（簡化版）
 
 使用 tshark 監聽 OVS 介面，每秒統計封包並寫入 stats.json
+
+tshark 由 supervisor 管理：
+    - 結束後自動重啟（指數 backoff）
+    - 維持一個 warm standby 程序，交接時以其緩衝補上，避免抓包空窗
+    - 每個視窗標記 capture_status（ok / partial / gap）與 capture_coverage
 """
 
 import subprocess
@@ -12,6 +17,9 @@ import threading
 from datetime import datetime
 from pathlib import Path
 import csv
+from collections import deque, OrderedDict
+
+from journal import EventJournal, EVENTS_DB_PATH
 
 STATS_CSV_PATH = Path("stats.csv")
 ATTACK_FLAG_PATH = Path("/tmp/attack_flag")
@@ -21,21 +29,174 @@ ATTACK_FLAG_PATH = Path("/tmp/attack_flag")
 INTERFACES = ["s1-eth1", "s1-eth2", "s1-eth3", "s1-eth4"]
 STATS_JSON_PATH = Path("stats.json")
 
+# 只抓進入 switch 的方向（Linux live capture 支援 inbound filter），
+# 同一個封包只會在 ingress port 被看到一次，per-port 統計才能定位來源
+CAPTURE_FILTER = "inbound"
+
+# 舊版同時抓 rx / tx，整體統計會把 switch 轉送出去的副本也算進去；
+# 門檻與 ai_model.pkl 都是以此尺度訓練，因此依轉送行為補回副本數
+COUNT_FORWARDED_COPIES = True
+MAC_TABLE_SIZE = 2048       # 與 OVS 預設 MAC learning table 大小相同
+
+# 被 drop 的來源不會被轉送，不補副本；drop 規則由事件日誌得知
+# （BLOCK / UNBLOCK / ESCALATE / DROP_EXPIRED，見 sync_dropped）。
+# 已知限制：限速（meter）中的流量仍以完整副本計算，實際只轉送 meter 放行的部分；
+# OVS 重啟後遺失的 BLOCK 規則在日誌中仍視為有效
+SKIP_DROPPED_COPIES = True
+DROP_EVENTS = ["BLOCK", "UNBLOCK", "ESCALATE", "DROP_EXPIRED"]
+
+CSV_HEADER = [
+    "timestamp_epoch",
+    "timestamp_readable",
+    "total_pkts",
+    "arp_pkts",
+    "unique_src_macs",
+    "arp_ratio",
+    "label",
+    "capture_status",
+    "capture_coverage",
+]
+
+# tshark supervisor 設定
+WARM_STANDBY = True
+STANDBY_BUFFER = 20000      # standby 緩衝的封包行數（交接時補送）
+RESTART_BACKOFF_INITIAL = 1.0
+RESTART_BACKOFF_MAX = 30.0
+STABLE_SECS = 10            # 存活超過 N 秒才重置 backoff
+STANDBY_RETRY_SECS = 5
+SUPERVISE_INTERVAL = 0.2
+
 # 全域統計變數
 stats_lock = threading.Lock()
 current_stats = {
     "total_pkts": 0,
     "arp_pkts": 0,
-    "src_macs": set()
+    "src_macs": set(),
+    "ports": {},
 }
 
+# 抓包狀態（同樣由 stats_lock 保護）
+capture_state = {
+    "down_since": time.time(),  # 目前沒有 active tshark 的起始時間
+    "down_secs": 0.0,           # 本視窗內累積的中斷秒數
+    "handovers": 0,             # 本視窗內的交接 / 重啟次數
+    "last_epoch": 0.0,          # 最後一個已計入的封包時間
+    "window_start": time.time(),
+}
+
+# MAC -> ingress port（LRU，模擬 OVS 的 MAC learning）
+mac_table = OrderedDict()
+
+# 目前被 drop 的 target -> 到期時間（None = 直到 UNBLOCK）
+# target 格式與 mitigation.py 相同：("mac", mac) / ("port", ifname) / ("port_arp", ifname)
+dropped_targets = {}
+
+
+def new_port_stats():
+    return {"total_pkts": 0, "arp_pkts": 0, "src_macs": set()}
+
 
-def write_stats():
+def summarize_port(port):
+    """單一 port 的視窗統計（寫入 stats.json）"""
+    port = port or new_port_stats()
+    return {
+        "total_pkts": port["total_pkts"],
+        "arp_pkts": port["arp_pkts"],
+        "unique_src_macs": len(port["src_macs"]),
+    }
+
+
+def capture_coverage():
+    """
+    計算本視窗的抓包覆蓋率並重置；需持有 stats_lock
+
+    回傳 (status, coverage)
+    """
+    now = time.time()
+    window = max(now - capture_state["window_start"], 1e-6)
+    down = capture_state["down_secs"]
+    if capture_state["down_since"] is not None:
+        down += now - capture_state["down_since"]
+        capture_state["down_since"] = now
+    coverage = max(0.0, 1.0 - down / window)
+
+    if coverage <= 0.0:
+        status = "gap"
+    elif coverage < 0.999 or capture_state["handovers"] > 0:
+        status = "partial"
+    else:
+        status = "ok"
+        coverage = 1.0
+
+    capture_state["down_secs"] = 0.0
+    capture_state["handovers"] = 0
+    capture_state["window_start"] = now
+    return status, round(coverage, 3)
+
+
+def apply_drop_event(event):
+    """將一筆 drop 相關事件套用到 dropped_targets；需持有 stats_lock"""
+    data = event.get("data") or {}
+    if "mac" in data:
+        target = ("mac", data["mac"])
+    elif "target" in data:
+        target = (data["target"], data["value"])
+    else:
+        return
+
+    if event["type"] == "BLOCK":
+        dropped_targets[target] = None
+    elif event["type"] == "ESCALATE":
+        timeout = data.get("hard_timeout")
+        dropped_targets[target] = event["ts"] + timeout if timeout else None
+    else:
+        dropped_targets.pop(target, None)
+
+
+def sync_dropped(journal, cursor):
+    """讀取 cursor 之後的 drop 相關事件並清掉已到期的 drop；回傳新的 cursor"""
+    while True:
+        events = journal.since(cursor, 500, DROP_EVENTS)
+        if not events:
+            break
+        with stats_lock:
+            for event in events:
+                apply_drop_event(event)
+        cursor = events[-1]["id"]
+
+    now = time.time()
+    with stats_lock:
+        for target, until in list(dropped_targets.items()):
+            if until is not None and now >= until:
+                del dropped_targets[target]
+    return cursor
+
+
+def is_dropped(src_mac, ifname, is_arp):
+    """此封包是否會被 OVS drop（不會被轉送）；需持有 stats_lock"""
+    if not dropped_targets:
+        return False
+    return (
+        ("mac", src_mac) in dropped_targets
+        or ("port", ifname) in dropped_targets
+        or (is_arp and ("port_arp", ifname) in dropped_targets)
+    )
+
+
+def write_stats(journal=None):
     """每秒寫入統計到 stats.json"""
+    cursor = 0
     while True:
         time.sleep(1)
         
+        if journal is not None:
+            try:
+                cursor = sync_dropped(journal, cursor)
+            except Exception as e:
+                print(f"!!! 讀取事件日誌失敗: {e}")
+        
         with stats_lock:
+            capture_status, coverage = capture_coverage()
             now = int(time.time())
             ts_readable = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
             
@@ -46,10 +207,19 @@ def write_stats():
                 "arp_pkts": current_stats["arp_pkts"],
                 "unique_src_macs": len(current_stats["src_macs"]),
                 "src_macs": sorted(current_stats["src_macs"]),
+                # 各 port 的視窗統計（給 baseline 偵測使用）
+                "ports": {
+                    ifname: summarize_port(current_stats["ports"].get(ifname))
+                    for ifname in INTERFACES
+                },
+                # gap：整個視窗沒有抓包；partial：部分中斷或 tshark 交接
+                "capture_status": capture_status,
+                "capture_coverage": coverage,
             }
             
             # 輸出統計
-            print(f"[{ts_readable}] total={stats['total_pkts']:<5} arp={stats['arp_pkts']:<5} macs={stats['unique_src_macs']}")
+            status_note = "" if capture_status == "ok" else f" [{capture_status} {coverage:.0%}]"
+            print(f"[{ts_readable}] total={stats['total_pkts']:<5} arp={stats['arp_pkts']:<5} macs={stats['unique_src_macs']}{status_note}")
             
             # 寫入檔案
             try:
@@ -81,51 +251,111 @@ def write_stats():
                     stats["arp_pkts"],
                     stats["unique_src_macs"],
                     round(arp_ratio, 4),
-                    label
+                    label,
+                    capture_status,
+                    coverage,
                 ])
             
             # 重置計數
             current_stats["total_pkts"] = 0
             current_stats["arp_pkts"] = 0
             current_stats["src_macs"] = set()
+            current_stats["ports"] = {}
 
 
-def capture_packets():
-    """使用 tshark 抓取封包"""
+def tshark_cmd():
     cmd = ["tshark"]
     for ifname in INTERFACES:
-        cmd += ["-i", ifname]
+        cmd += ["-i", ifname, "-f", CAPTURE_FILTER]
     cmd += [
         "-T", "fields",
         "-e", "frame.time_epoch",
         "-e", "eth.src",
         "-e", "_ws.col.Protocol",
         "-e", "arp.opcode",
+        "-e", "frame.interface_name",
+        "-e", "eth.dst",
         "-l",
     ]
+    return cmd
+
+
+def learn_mac(mac, ifname, table=mac_table):
+    """記錄來源 MAC 所在的 ingress port；使用全域 mac_table 時需持有 stats_lock"""
+    table[mac] = ifname
+    table.move_to_end(mac)
+    if len(table) > MAC_TABLE_SIZE:
+        table.popitem(last=False)
+
+
+def forwarded_copies(dst_mac, ifname, table=mac_table, n_ports=len(INTERFACES)):
+    """
+    switch 會將此封包送出幾份（standalone 模式 = learning switch）：
+        broadcast / multicast / 未學到的 unicast -> flood 到其他所有 port
+        已學到的 unicast -> 1 份（目的在同一 port 則 0）
+
+    traffic_gen.py 以自己的 table 呼叫，產生的 stats.csv 與實際抓包同一尺度
+    """
+    if not dst_mac or int(dst_mac[:2], 16) & 1:
+        return n_ports - 1
+    home = table.get(dst_mac)
+    if home is None:
+        return n_ports - 1
+    return 0 if home == ifname else 1
+
+
+def count_packet(parts):
+    """
+    將一個封包計入目前視窗；需持有 stats_lock
+
+    tshark 只抓 inbound，因此 parts[4] 即為封包的 ingress port
+    """
+    ifname = parts[4] if len(parts) >= 5 and parts[4] else ""
+    src_mac = parts[1] if len(parts) >= 2 and parts[1] else ""
+    dst_mac = parts[5] if len(parts) >= 6 and parts[5] else ""
     
-    print(">>> collector.py 啟動")
-    print(f">>> 執行: {' '.join(cmd)}")
+    # 檢查是否是 ARP
+    proto = parts[2].upper() if len(parts) >= 3 and parts[2] else ""
+    arp_opcode = parts[3] if len(parts) >= 4 and parts[3] else ""
+    is_arp = bool(arp_opcode) or "ARP" in proto
     
-    proc = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL,
-        text=True,
-        bufsize=1,
-    )
+    copies = 1
+    if COUNT_FORWARDED_COPIES and ifname and not is_dropped(src_mac, ifname, is_arp):
+        copies += forwarded_copies(dst_mac, ifname)
     
-    print(">>> 等待封包中...")
+    current_stats["total_pkts"] += copies
     
-    pkt_count = 0
-    while True:
-        line = proc.stdout.readline()
-        if not line:
-            if proc.poll() is not None:
-                print("!!! tshark 已結束")
-                break
-            continue
-        
+    # 來源介面（只計 ingress）
+    port = None
+    if ifname:
+        port = current_stats["ports"].setdefault(ifname, new_port_stats())
+        port["total_pkts"] += 1
+    
+    # MAC 地址
+    if src_mac:
+        current_stats["src_macs"].add(src_mac)
+        if port is not None:
+            port["src_macs"].add(src_mac)
+            learn_mac(src_mac, ifname)
+    
+    if is_arp:
+        current_stats["arp_pkts"] += copies
+        if port is not None:
+            port["arp_pkts"] += 1
+
+    try:
+        capture_state["last_epoch"] = max(capture_state["last_epoch"], float(parts[0]))
+    except (ValueError, IndexError):
+        pass
+
+
+def read_packets(backend):
+    """
+    讀取單一 tshark 的輸出
+
+    active 時直接計入統計；standby 時只放進緩衝，等交接時補送
+    """
+    for line in backend["proc"].stdout:
         line = line.strip()
         if not line:
             continue
@@ -133,31 +363,150 @@ def capture_packets():
         parts = line.split("\t")
         
         with stats_lock:
-            current_stats["total_pkts"] += 1
+            if backend["active"]:
+                count_packet(parts)
+                backend["count"] += 1
+            else:
+                backend["buffer"].append(parts)
+                continue
+        
+        # 顯示前幾個封包
+        if backend["count"] <= 5:
+            print(f">>> [封包 {backend['count']}] {line[:60]}")
+
+
+def start_backend(active):
+    """啟動一個 tshark；失敗回傳 None"""
+    try:
+        proc = subprocess.Popen(
+            tshark_cmd(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+    except Exception as e:
+        print(f"!!! tshark 啟動失敗: {e}")
+        return None
+    
+    backend = {
+        "proc": proc,
+        "active": False,
+        "started": time.time(),
+        "count": 0,
+        "buffer": deque(maxlen=STANDBY_BUFFER),
+    }
+    backend["thread"] = threading.Thread(target=read_packets, args=(backend,), daemon=True)
+    backend["thread"].start()
+    if active:
+        promote(backend)
+    print(f">>> tshark 啟動 (pid={proc.pid}, {'active' if active else 'standby'})")
+    return backend
+
+
+def promote(backend):
+    """將 backend 設為 active，補送 standby 緩衝中尚未計入的封包"""
+    with stats_lock:
+        replayed = 0
+        last_epoch = capture_state["last_epoch"]
+        for parts in backend["buffer"]:
+            try:
+                if float(parts[0]) <= last_epoch:
+                    continue
+            except (ValueError, IndexError):
+                continue
+            count_packet(parts)
+            replayed += 1
+        backend["buffer"].clear()
+        backend["active"] = True
+        
+        if capture_state["down_since"] is not None:
+            capture_state["down_secs"] += time.time() - capture_state["down_since"]
+            capture_state["down_since"] = None
+        capture_state["handovers"] += 1
+    
+    if replayed:
+        print(f">>> standby 接手，補送 {replayed} 個封包")
+
+
+def mark_down():
+    with stats_lock:
+        if capture_state["down_since"] is None:
+            capture_state["down_since"] = time.time()
+
+
+def stop_backend(backend):
+    if backend is not None and backend["proc"].poll() is None:
+        backend["proc"].terminate()
+        try:
+            backend["proc"].wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            backend["proc"].kill()
+
+
+def alive(backend):
+    return backend is not None and backend["proc"].poll() is None
+
+
+def capture_packets():
+    """使用 tshark 抓取封包；tshark 結束時自動交接 / 重啟"""
+    print(">>> collector.py 啟動")
+    print(f">>> 執行: {' '.join(tshark_cmd())}")
+    print(">>> 等待封包中...")
+    
+    active = None
+    standby = None
+    backoff = RESTART_BACKOFF_INITIAL
+    next_standby_at = 0.0
+    
+    try:
+        while True:
+            if active is None:
+                if alive(standby):
+                    print(">>> 切換至 standby tshark")
+                    active, standby = standby, None
+                    promote(active)
+                else:
+                    active = start_backend(active=True)
+                    if active is None:
+                        time.sleep(backoff)
+                        backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+                        continue
             
-            # MAC 地址
-            if len(parts) >= 2 and parts[1]:
-                current_stats["src_macs"].add(parts[1])
+            now = time.time()
+            if WARM_STANDBY and not alive(standby) and now >= next_standby_at:
+                standby = start_backend(active=False)
+                next_standby_at = now + STANDBY_RETRY_SECS
             
-            # 檢查是否是 ARP
-            proto = parts[2].upper() if len(parts) >= 3 and parts[2] else ""
-            arp_opcode = parts[3] if len(parts) >= 4 and parts[3] else ""
+            time.sleep(SUPERVISE_INTERVAL)
             
-            if arp_opcode or "ARP" in proto:
-                current_stats["arp_pkts"] += 1
-        
-        # 顯示前幾個封包
-        pkt_count += 1
-        if pkt_count <= 5:
-            print(f">>> [封包 {pkt_count}] {line[:60]}")
+            if not alive(active):
+                # 先讀完結束前的輸出，再讓 standby 補送，避免重複計數
+                active["thread"].join(timeout=1)
+                with stats_lock:
+                    active["active"] = False
+                mark_down()
+                lived = time.time() - active["started"]
+                print(f"!!! tshark 已結束 (rc={active['proc'].returncode}, 存活 {lived:.1f}s)")
+                active = None
+                
+                if lived >= STABLE_SECS:
+                    backoff = RESTART_BACKOFF_INITIAL
+                elif not alive(standby):
+                    print(f">>> {backoff:.0f}s 後重啟 tshark")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+    finally:
+        stop_backend(active)
+        stop_backend(standby)
 
 
-def main():
-    print("=" * 50)
-    print("🔍 Packet Collector")
-    print("=" * 50)
+def ensure_csv_header():
+    """
+    初始化 CSV（不存在 或 空檔 才寫 header）
 
-    # === 初始化 CSV（不存在 或 空檔 才寫 header）===
+    舊版 stats.csv 沒有 capture_* 欄位時補上（歷史資料狀態未知，留空）
+    """
     need_header = (
         not STATS_CSV_PATH.exists()
         or STATS_CSV_PATH.stat().st_size == 0
@@ -165,19 +514,36 @@ def main():
 
     if need_header:
         with open(STATS_CSV_PATH, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "timestamp_epoch",
-                "timestamp_readable",
-                "total_pkts",
-                "arp_pkts",
-                "unique_src_macs",
-                "arp_ratio",
-                "label"
-            ])
+            csv.writer(f).writerow(CSV_HEADER)
+        return
+
+    with open(STATS_CSV_PATH, newline="") as f:
+        rows = list(csv.reader(f))
+    if rows and rows[0] == CSV_HEADER:
+        return
+
+    print(f">>> 更新 {STATS_CSV_PATH} 欄位")
+    old_header = rows[0]
+    tmp_path = STATS_CSV_PATH.with_suffix(".csv.tmp")
+    with open(tmp_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for row in rows[1:]:
+            record = dict(zip(old_header, row))
+            writer.writerow([record.get(col, "") for col in CSV_HEADER])
+    tmp_path.replace(STATS_CSV_PATH)
+
+
+def main():
+    print("=" * 50)
+    print("🔍 Packet Collector")
+    print("=" * 50)
+
+    ensure_csv_header()
     
     # 啟動統計寫入執行緒
-    writer_thread = threading.Thread(target=write_stats, daemon=True)
+    journal = EventJournal(EVENTS_DB_PATH, source="collector") if SKIP_DROPPED_COPIES else None
+    writer_thread = threading.Thread(target=write_stats, args=(journal,), daemon=True)
     writer_thread.start()
     
     # 開始抓取封包
@@ -8,10 +8,11 @@ import os
 import subprocess
 import threading
 import time
-from datetime import datetime
 from collections import deque
 from flask import Flask, render_template, jsonify, request
 
+from journal import EventJournal, EVENTS_DB_PATH
+
 app = Flask(__name__)
 
 # ========== 設定 ==========
@@ -25,10 +26,13 @@ HISTORY_SIZE = 60
 
 AI_RESULT_PATH = "ai_result.json"
 
+ALERTS_LIMIT = 50
+ALERTS_SINCE_LIMIT = 500
+
 
 # ========== 全域狀態 ==========
 history_data = deque(maxlen=HISTORY_SIZE)
-alerts = []
+journal = EventJournal(EVENTS_DB_PATH, source="dashboard")
 blocked_macs = set()
 detection_state = {
     "arp_high_count": 0,
@@ -67,18 +71,9 @@ def block_mac(mac: str):
         return False
 
 
-def add_alert(alert_type: str, message: str):
-    """新增警報"""
-    global alerts
-    alert = {
-        "id": len(alerts) + 1,
-        "type": alert_type,
-        "message": message,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-    }
-    alerts.insert(0, alert)
-    if len(alerts) > 50:
-        alerts = alerts[:50]
+def add_alert(alert_type: str, message: str, data=None):
+    """新增警報（寫入事件日誌）"""
+    journal.append(alert_type, message, data)
     print(f"[dashboard] 📝 新增警報: {message}")
 
 
@@ -102,6 +97,12 @@ def monitor_loop():
             
             detection_state["last_timestamp"] = ts
             
+            # collector 抓包中斷的視窗沒有資料，不列入偵測
+            capture_status = stats.get("capture_status", "ok")
+            if capture_status == "gap":
+                time.sleep(1)
+                continue
+            
             # 儲存歷史
             history_data.append({
                 "timestamp": ts,
@@ -117,21 +118,22 @@ def monitor_loop():
             if arp_pkts > THRESHOLD_ARP:
                 detection_state["arp_high_count"] += 1
                 print(f"[dashboard] ⚠️ ARP 高: {arp_pkts} (連續 {detection_state['arp_high_count']})")
-            else:
+            elif capture_status != "partial":
                 detection_state["arp_high_count"] = 0
                 detection_state["arp_under_attack"] = False
             
             if detection_state["arp_high_count"] >= ARP_CONSEC and not detection_state["arp_under_attack"]:
                 detection_state["arp_under_attack"] = True
                 print(f"[dashboard] 🚨 ARP FLOOD 確認！")
-                add_alert("ARP_FLOOD", f"ARP Flood 攻擊！封包數: {arp_pkts}/秒")
+                add_alert("ARP_FLOOD", f"ARP Flood 攻擊！封包數: {arp_pkts}/秒",
+                          {"arp_pkts": arp_pkts, "src_macs": macs})
                 
                 # 封鎖 MAC（在鎖外面執行）
                 for mac in macs:
                     if mac not in blocked_macs:
                         if block_mac(mac):
                             blocked_macs.add(mac)
-                            add_alert("BLOCK", f"已封鎖: {mac}")
+                            add_alert("BLOCK", f"已封鎖: {mac}", {"mac": mac})
             
             time.sleep(1)
             
@@ -162,7 +164,31 @@ def api_history():
 
 @app.route("/api/alerts")
 def api_alerts():
-    return jsonify(alerts)
+    """
+    GET /api/alerts                 最近 50 筆（新到舊，最後一次清除之後）
+    GET /api/alerts?since=<id>      id 之後的新事件（舊到新，含 CLEAR）
+    可加 type=ARP_FLOOD,BLOCK、limit、from / to（epoch 秒）
+    """
+    types = [t for t in request.args.get("type", "").split(",") if t] or None
+
+    since = None
+    if "since" in request.args:
+        since = request.args.get("since", type=int)
+        if since is None:
+            return jsonify({"error": "since 必須為整數"}), 400
+
+    default_limit = ALERTS_SINCE_LIMIT if since is not None else ALERTS_LIMIT
+    limit = request.args.get("limit", default_limit, type=int)
+    limit = max(1, min(limit, ALERTS_SINCE_LIMIT))
+
+    if since is not None:
+        return jsonify(journal.since(since, limit, types))
+
+    return jsonify(journal.recent(
+        limit, types,
+        start_ts=request.args.get("from", type=float),
+        end_ts=request.args.get("to", type=float),
+    ))
 
 
 @app.route("/api/blocked")
@@ -176,7 +202,8 @@ def api_status():
         "arp_under_attack": detection_state["arp_under_attack"],
         "mac_under_attack": detection_state["mac_under_attack"],
         "blocked_count": len(blocked_macs),
-        "alert_count": len(alerts),
+        "alert_count": journal.count(ALERTS_LIMIT),
+        "last_event_id": journal.last_id(),
         "thresholds": {
             "arp": THRESHOLD_ARP,
             "arp_consec": ARP_CONSEC,
@@ -194,15 +221,15 @@ def api_unblock():
         cmd = ["ovs-ofctl", "del-flows", SWITCH_NAME, f"dl_src={mac}"]
         subprocess.run(cmd, capture_output=True, timeout=5)
         blocked_macs.discard(mac)
-        add_alert("UNBLOCK", f"已解除: {mac}")
+        add_alert("UNBLOCK", f"已解除: {mac}", {"mac": mac})
         return jsonify({"success": True})
     return jsonify({"error": "MAC 不存在"}), 404
 
 
 @app.route("/api/clear_alerts", methods=["POST"])
 def api_clear_alerts():
-    global alerts
-    alerts = []
+    # 日誌為 append-only：寫入 CLEAR 事件，之後的查詢只回傳其後的事件
+    journal.clear()
     return jsonify({"success": True})
 
 @app.route("/api/ai_status")
@@ -6,7 +6,9 @@ detector.py (Hybrid Rule-based + AI)
     - 每秒讀取 stats.json
     - 使用「規則式 + AI」混合偵測 ARP Flood
     - MAC Flood 仍維持規則式
-    - 偵測到攻擊後自動對 OVS 下 drop flow
+    - 自適應基準線（EWMA z-score，per-switch / per-port）作為額外訊號
+    - 偵測到攻擊後自動對 OVS 下 drop flow，或以 OVS meter 限速（ratelimit）
+    - 警報、封鎖、限速與 AI 判斷變化寫入事件日誌（journal.py）
 """
 
 import json
@@ -19,22 +21,44 @@ from datetime import datetime
 import joblib
 import pandas as pd
 
+from baseline import BaselineDetector
+from mitigation import RateLimiter
+from journal import EventJournal, EVENTS_DB_PATH
+
 # ---------------- 基本設定 ----------------
 
 STATS_JSON_PATH = "stats.json"
 SWITCH_NAME = "s1"
 
 # 模式設定
-ACTION_MODE = "block"   # "log" | "block"
+ACTION_MODE = "block"   # "log" | "block" | "ratelimit"
+
+# ratelimit 模式設定（其餘參數見 mitigation.py）
+# 限速 + burst 必須低於 PORT_THRESHOLD_ARP：meter 放行的速率本身不應被判為 flood。
+# collector 在 OVS 套用 meter 之前抓包，限速中的來源只要持續送出仍會被視為超標，
+# 因此會在 RATE_LIMIT_ESCALATE_AFTER 秒後升級為 drop
+RATE_LIMIT_PPS = 5
+RATE_LIMIT_BURST = 5
+RATE_LIMIT_LIFT_AFTER = 30      # 連續 N 秒未超標 -> 解除
+RATE_LIMIT_ESCALATE_AFTER = 10  # 限速後仍連續 N 秒超標 -> drop
+RATE_LIMIT_DROP_TIMEOUT = 300   # 升級後 drop flow 的存活秒數
 
 # 是否啟用 AI
 USE_AI = True
 AI_MODEL_PATH = "ai_model.pkl"
 
+# 是否啟用自適應基準線偵測（參數見 baseline.py）
+# 預設關閉：安靜網路上比固定門檻敏感得多，且 backtest.py 未模擬此訊號
+USE_BASELINE = False
+
 # 規則式門檻
 THRESHOLD_ARP = 50
 ARP_CONSEC = 3
 
+# per-port 統計每個封包只在 ingress port 計一次，整體統計則包含 switch flood 出去的副本
+# （4 台主機時 broadcast ARP 約 4 倍），per-port 門檻以相同比例換算
+PORT_THRESHOLD_ARP = 12
+
 THRESHOLD_MAC = 20
 MAC_CONSEC = 3
 
@@ -54,6 +78,10 @@ if USE_AI:
         print(f"[detector] AI model load failed: {e}")
         USE_AI = False
 
+# ---------------- 事件日誌 ----------------
+
+journal = EventJournal(EVENTS_DB_PATH, source="detector")
+
 # ---------------- 工具函式 ----------------
 
 def load_stats(path):
@@ -81,9 +109,77 @@ def block_mac(switch, mac):
     subprocess.run(cmd, check=False)
 
 
+def hot_ports(stats, feature, threshold, anomalies):
+    """
+    超過門檻或被 baseline 標記的 ingress port
+
+    collector 的 per-port 統計只計入從該 port 進入 switch 的封包，
+    flood 到其他 port 的副本不會讓受害主機的 port 被誤判
+    """
+    ports = {
+        ifname for ifname, p in stats.get("ports", {}).items()
+        if p.get(feature, 0) > threshold
+    }
+    ports.update(port for _, port, _ in anomalies.get(feature, []) if port != "*")
+    return sorted(ports)
+
+
+def top_port(stats, feature):
+    """
+    整體超標但沒有單一 port 超標時：只有當某個 ingress port 佔了過半流量，
+    才將其視為來源；否則不限速任何 port，避免波及無辜主機
+    """
+    ports = stats.get("ports", {})
+    total = sum(p.get(feature, 0) for p in ports.values())
+    for ifname, p in ports.items():
+        if total > 0 and p.get(feature, 0) * 2 > total:
+            return [ifname]
+    return []
+
+
+def ratelimit_targets(stats, kind, anomalies):
+    """
+    限速對象：以攻擊流量的 ingress port 為單位（MAC Flood 時來源 MAC 數量不受控）；
+    只有舊版 collector（沒有 per-port 資訊）才退回 per-source MAC
+    """
+    if "ports" not in stats:
+        return [("mac", mac) for mac in stats.get("src_macs", [])]
+
+    if kind == "arp":
+        ports = hot_ports(stats, "arp_pkts", PORT_THRESHOLD_ARP, anomalies) or top_port(stats, "arp_pkts")
+        return [("port_arp", p) for p in ports]
+    ports = hot_ports(stats, "unique_src_macs", THRESHOLD_MAC, anomalies) or top_port(stats, "unique_src_macs")
+    return [("port", p) for p in ports]
+
+
+def offending_targets(stats, arp_high, mac_high, anomalies):
+    """
+    本視窗仍超標的 target（供 RateLimiter 解除 / 升級判斷）
+
+    整體仍超標時與 ratelimit_targets 使用相同的挑選方式（包含 top_port），
+    否則以 top_port 限速的 target 會在攻擊途中被解除
+    """
+    targets = set()
+    for port in hot_ports(stats, "arp_pkts", PORT_THRESHOLD_ARP, anomalies):
+        targets.add(("port_arp", port))
+    for port in hot_ports(stats, "unique_src_macs", THRESHOLD_MAC, anomalies):
+        targets.add(("port", port))
+    if arp_high:
+        targets.update(ratelimit_targets(stats, "arp", anomalies))
+    if mac_high:
+        targets.update(ratelimit_targets(stats, "mac", anomalies))
+    return targets
+
+
 # ---------------- 攻擊處理 ----------------
 
-def handle_arp_attack(stats, blocked_macs):
+def journal_targets(event_type, targets, ts, extra=None):
+    for kind, value in targets:
+        journal.append(event_type, f"{event_type} {kind} {value}",
+                       {"target": kind, "value": value, **(extra or {})}, ts)
+
+
+def handle_arp_attack(stats, blocked_macs, limiter=None, anomalies=None):
     ts = stats.get("timestamp_epoch", 0)
     ts_readable = stats.get("timestamp_readable", pretty_time(ts))
     macs = stats.get("src_macs", [])
@@ -95,15 +191,22 @@ def handle_arp_attack(stats, blocked_macs):
     print(f"MACs        : {macs}")
     print("===========================================\n")
 
+    journal.append("ARP_FLOOD", f"ARP Flood detected: {arp_pkts} ARP pkts/s",
+                   {"arp_pkts": arp_pkts, "src_macs": macs}, ts)
+
     if ACTION_MODE == "block":
         for mac in macs:
             if mac not in blocked_macs:
                 print(f"[detector] Block MAC (ARP): {mac}")
                 block_mac(SWITCH_NAME, mac)
                 blocked_macs.add(mac)
+                journal.append("BLOCK", f"Blocked {mac} (ARP)", {"mac": mac}, ts)
+    elif ACTION_MODE == "ratelimit" and limiter is not None:
+        added = limiter.limit(ratelimit_targets(stats, "arp", anomalies or {}), ts)
+        journal_targets("RATELIMIT", added, ts)
 
 
-def handle_mac_attack(stats, blocked_macs):
+def handle_mac_attack(stats, blocked_macs, limiter=None, anomalies=None):
     ts = stats.get("timestamp_epoch", 0)
     ts_readable = stats.get("timestamp_readable", pretty_time(ts))
     macs = stats.get("src_macs", [])
@@ -113,18 +216,26 @@ def handle_mac_attack(stats, blocked_macs):
     print(f"MACs  : {macs}")
     print("===========================================\n")
 
+    journal.append("MAC_FLOOD", f"MAC Flood detected: {len(macs)} source MACs",
+                   {"unique_src_macs": len(macs), "src_macs": macs}, ts)
+
     if ACTION_MODE == "block":
         for mac in macs:
             if mac not in blocked_macs:
                 print(f"[detector] Block MAC (MAC): {mac}")
                 block_mac(SWITCH_NAME, mac)
                 blocked_macs.add(mac)
+                journal.append("BLOCK", f"Blocked {mac} (MAC)", {"mac": mac}, ts)
+    elif ACTION_MODE == "ratelimit" and limiter is not None:
+        added = limiter.limit(ratelimit_targets(stats, "mac", anomalies or {}), ts)
+        journal_targets("RATELIMIT", added, ts)
 
 
 # ---------------- 主偵測迴圈 ----------------
 
 def detector_loop():
     last_ts = None
+    last_ai_prediction = None
 
     arp_high_count = 0
     mac_high_count = 0
@@ -134,9 +245,28 @@ def detector_loop():
 
     blocked_macs = set()
 
+    baseline = BaselineDetector() if USE_BASELINE else None
+
+    limiter = None
+    if ACTION_MODE == "ratelimit":
+        if RATE_LIMIT_PPS + RATE_LIMIT_BURST >= PORT_THRESHOLD_ARP:
+            raise ValueError(
+                f"RATE_LIMIT_PPS + RATE_LIMIT_BURST ({RATE_LIMIT_PPS + RATE_LIMIT_BURST}) "
+                f"必須小於 PORT_THRESHOLD_ARP ({PORT_THRESHOLD_ARP})"
+            )
+        limiter = RateLimiter(
+            SWITCH_NAME,
+            rate=RATE_LIMIT_PPS,
+            burst=RATE_LIMIT_BURST,
+            lift_after=RATE_LIMIT_LIFT_AFTER,
+            escalate_after=RATE_LIMIT_ESCALATE_AFTER,
+            drop_timeout=RATE_LIMIT_DROP_TIMEOUT,
+        )
+
     print(">>> Hybrid detector started")
-    print(f"    USE_AI      : {USE_AI}")
-    print(f"    ACTION_MODE : {ACTION_MODE}\n")
+    print(f"    USE_AI       : {USE_AI}")
+    print(f"    USE_BASELINE : {USE_BASELINE}")
+    print(f"    ACTION_MODE  : {ACTION_MODE}\n")
 
     while True:
         stats = load_stats(STATS_JSON_PATH)
@@ -150,6 +280,14 @@ def detector_loop():
             continue
         last_ts = ts
 
+        # collector 的抓包狀態：gap 視窗沒有資料，不能當成安靜流量
+        capture_status = stats.get("capture_status", "ok")
+        if capture_status == "gap":
+            print(f"[{stats.get('timestamp_readable', pretty_time(ts))}] capture gap, skip")
+            time.sleep(POLL_INTERVAL)
+            continue
+        partial = capture_status == "partial"
+
         total_pkts = stats.get("total_pkts", 0)
         arp_pkts = stats.get("arp_pkts", 0)
         uniq_mac = stats.get("unique_src_macs", 0)
@@ -161,8 +299,18 @@ def detector_loop():
         print(
             f"[{ts_readable}] total={total_pkts:<5} "
             f"arp={arp_pkts:<5} unique_mac={uniq_mac}"
+            + (" [partial]" if partial else "")
         )
 
+        # ===== 自適應基準線 =====
+
+        anomalies = baseline.observe(SWITCH_NAME, stats, learn=not partial) if baseline else {}
+        baseline_says_arp = "arp_pkts" in anomalies
+        baseline_says_mac = "unique_src_macs" in anomalies
+
+        for feature, hits in anomalies.items():
+            print(f"[detector] Baseline anomaly {feature}: {hits}")
+
         # ===== ARP Flood（Hybrid） =====
 
         rule_says_attack = arp_pkts > THRESHOLD_ARP
@@ -196,30 +344,61 @@ def detector_loop():
                 with open(AI_RESULT_PATH, "w") as f:
                     json.dump(ai_result, f, indent=2)
 
+                # AI 判斷改變時才寫入日誌，避免每秒一筆
+                if ai_result["prediction"] != last_ai_prediction:
+                    last_ai_prediction = ai_result["prediction"]
+                    journal.append(
+                        "AI_VERDICT",
+                        f"AI: {ai_result['prediction']} ({ai_result['confidence']:.0%})",
+                        ai_result, ts,
+                    )
+
             except Exception as e:
                 print(f"[detector] AI predict error: {e}")
 
-        if rule_says_attack or ai_says_attack:
+        arp_high = rule_says_attack or ai_says_attack or baseline_says_arp
+        mac_high = uniq_mac > THRESHOLD_MAC or baseline_says_mac
+
+        # ===== 限速中的 target：解除 / 升級 =====
+
+        if limiter is not None and not partial:
+            lifted, escalated, expired = limiter.tick(
+                offending_targets(stats, arp_high, mac_high, anomalies), ts
+            )
+            journal_targets("LIFT", lifted, ts)
+            # collector 依 hard_timeout 判斷 drop 何時失效（detector 停止時不會有 DROP_EXPIRED）
+            journal_targets("ESCALATE", escalated, ts, {"hard_timeout": RATE_LIMIT_DROP_TIMEOUT})
+            journal_targets("DROP_EXPIRED", expired, ts)
+
+            # 攻擊仍在進行時 target 被解除或 drop 到期：重新允許觸發，讓它能再次被限速
+            released = {kind for kind, _ in lifted + expired}
+            if released & {"port_arp", "mac"}:
+                arp_under_attack = False
+            if released & {"port", "mac"}:
+                mac_under_attack = False
+
+        if arp_high:
             arp_high_count += 1
-        else:
+        elif not partial:
+            # partial 視窗資料不完整，不視為攻擊已停止
             arp_high_count = 0
             arp_under_attack = False
 
         if arp_high_count >= ARP_CONSEC and not arp_under_attack:
             arp_under_attack = True
-            handle_arp_attack(stats, blocked_macs)
+            handle_arp_attack(stats, blocked_macs, limiter, anomalies)
 
-        # ===== MAC Flood（Rule-based） =====
+        # ===== MAC Flood（Rule-based + Baseline） =====
 
-        if uniq_mac > THRESHOLD_MAC:
+        if mac_high:
             mac_high_count += 1
-        else:
+        elif not partial:
             mac_high_count = 0
             mac_under_attack = False
 
         if mac_high_count >= MAC_CONSEC and not mac_under_attack:
             mac_under_attack = True
-            handle_mac_attack(stats, blocked_macs)
+            handle_mac_attack(stats, blocked_macs, limiter, anomalies)
 
         time.sleep(POLL_INTERVAL)
 
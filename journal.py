@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+journal.py - 警報 / 防護事件日誌（SQLite, WAL）
+
+功能：
+    - append-only：警報、封鎖、解除封鎖、限速、AI 判斷都寫入同一張表
+    - id 單調遞增（AUTOINCREMENT），清除或重啟後也不會重複
+    - since(id) 以 cursor 增量讀取，dashboard 輪詢只取新事件
+    - 依時間 / 類型建立索引，大量歷史資料下查詢仍然快速
+    - WAL 模式：detector 與 dashboard 兩個程序可同時讀寫
+
+清除警報不刪除資料，而是寫入一筆 CLEAR 事件，recent() 只回傳其後的事件。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# ---------------- 基本設定 ----------------
+
+EVENTS_DB_PATH = "events.db"
+
+EVENT_CLEAR = "CLEAR"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts      REAL    NOT NULL,
+    type    TEXT    NOT NULL,
+    message TEXT    NOT NULL,
+    source  TEXT    NOT NULL DEFAULT '',
+    data    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS idx_events_type_id ON events (type, id);
+"""
+
+
+def row_to_event(row):
+    event = {
+        "id": row["id"],
+        "type": row["type"],
+        "message": row["message"],
+        "source": row["source"],
+        "ts": row["ts"],
+        "timestamp": datetime.fromtimestamp(row["ts"]).strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if row["data"]:
+        event["data"] = json.loads(row["data"])
+    return event
+
+
+class EventJournal:
+    """單一 sqlite 連線 + lock；Flask threaded 與背景執行緒可共用"""
+
+    def __init__(self, path=EVENTS_DB_PATH, source=""):
+        self.path = path
+        self.source = source
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+
+    def append(self, event_type, message, data=None, ts=None):
+        """寫入一筆事件，回傳 id"""
+        ts = time.time() if ts is None else ts
+        payload = json.dumps(data, ensure_ascii=False) if data is not None else None
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT INTO events (ts, type, message, source, data) VALUES (?, ?, ?, ?, ?)",
+                (ts, event_type, message, self.source, payload),
+            )
+            self.conn.commit()
+            return cur.lastrowid
+
+    def _select(self, where, params, order, limit):
+        sql = "SELECT * FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY id {order} LIMIT ?"
+        with self.lock:
+            rows = self.conn.execute(sql, params + [limit]).fetchall()
+        return [row_to_event(r) for r in rows]
+
+    def since(self, last_id, limit=500, types=None):
+        """id > last_id 的事件（舊到新）；回傳最後一筆的 id 即為下一次的 cursor"""
+        where, params = ["id > ?"], [int(last_id)]
+        if types:
+            where.append(f"type IN ({','.join('?' * len(types))})")
+            params += list(types)
+        return self._select(where, params, "ASC", limit)
+
+    def last_id(self):
+        """目前最新事件的 id（新 client 的初始 cursor）"""
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(id) FROM events").fetchone()
+        return row[0] or 0
+
+    def last_clear_id(self):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MAX(id) FROM events WHERE type = ?", (EVENT_CLEAR,)
+            ).fetchone()
+        return row[0] or 0
+
+    def recent(self, limit=50, types=None, start_ts=None, end_ts=None):
+        """
+        最近的事件（新到舊）
+
+        未指定時間範圍時只包含最後一次 CLEAR 之後的事件；
+        指定 start_ts / end_ts 時為歷史查詢，不受 CLEAR 影響
+        """
+        where, params = ["type != ?"], [EVENT_CLEAR]
+        if start_ts is None and end_ts is None:
+            where.append("id > ?")
+            params.append(self.last_clear_id())
+        if types:
+            where.append(f"type IN ({','.join('?' * len(types))})")
+            params += list(types)
+        if start_ts is not None:
+            where.append("ts >= ?")
+            params.append(start_ts)
+        if end_ts is not None:
+            where.append("ts < ?")
+            params.append(end_ts)
+        return self._select(where, params, "DESC", limit)
+
+    def count(self, limit=None):
+        """最後一次 CLEAR 之後的事件數；limit 為計數上限，避免每次輪詢都掃過大量資料"""
+        clear_id = self.last_clear_id()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*) FROM ("
+                "SELECT 1 FROM events WHERE id > ? AND type != ? LIMIT ?)",
+                (clear_id, EVENT_CLEAR, -1 if limit is None else limit),
+            ).fetchone()
+        return row[0]
+
+    def clear(self):
+        return self.append(EVENT_CLEAR, "alerts cleared")
@@ -10,6 +10,10 @@ features = [
     "label"
 ]
 
+# 抓包中斷 / 不完整的秒數不能當成正常流量（舊資料沒有此欄位則保留）
+if "capture_status" in df.columns:
+    df = df[df["capture_status"].fillna("ok") == "ok"]
+
 df_ai = df[features]
 
 # 移除 total_pkts = 0 的秒（無資訊）
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+mitigation.py - OVS meter 限速防護（ACTION_MODE = "ratelimit"）
+
+功能：
+    - 將攻擊來源（dl_src）、某個 port 或某個 port 的 ARP 流量導向 per-target meter
+    - 持續觀察：攻擊停止一段時間後解除限速；持續超標則升級為 drop
+    - drop 帶 hard_timeout，到期由 OVS 自動移除，之後可重新評估
+    - meter 數量有上限，MAC Flood 時大量來源改共用 overflow meter，
+      避免 meter / flow 暴增
+
+ovs-ofctl 指令可替換（ofctl 參數），方便以 stub CLI 測試。
+"""
+
+import subprocess
+import time
+
+# ---------------- 基本設定 ----------------
+
+OFCTL_CMD = ["sudo", "ovs-ofctl", "-O", "OpenFlow13"]
+
+RATE_PPS = 5               # 每個 target 的限速（packets/s），需低於 per-port 偵測門檻
+BURST_PKTS = 5
+LIFT_AFTER = 30            # 連續 N 秒未再超標 -> 解除限速
+ESCALATE_AFTER = 10        # 限速後仍連續 N 秒超標 -> 升級為 drop
+DROP_TIMEOUT = 300         # 升級後的 drop flow 存活秒數（OVS hard_timeout）
+
+MAX_METERS = 64            # 同時存在的 per-target meter 上限
+MAX_NEW_PER_EVENT = 8      # 單次事件最多新增的 per-target meter
+MAX_OVERFLOW_FLOWS = 256   # 共用 overflow meter 的 flow 上限
+OVERFLOW_METER_ID = 1      # 保留給 overflow 共用
+
+PRIO_LIMIT = 150
+PRIO_DROP = 200            # 與 detector.block_mac 相同
+
+
+def _run(cmd):
+    result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        print(f"[mitigation] ❌ {' '.join(cmd)}: {result.stderr.strip()}")
+    return result.returncode == 0
+
+
+def target_match(target):
+    """
+    target -> OpenFlow match 字串
+        ("mac", mac)          : 該來源 MAC 的所有流量
+        ("port", ifname)      : 該 port 進來的所有流量
+        ("port_arp", ifname)  : 該 port 進來的 ARP 流量
+    """
+    kind, value = target
+    if kind == "mac":
+        return f"dl_src={value}"
+    if kind == "port":
+        return f"in_port={value}"
+    if kind == "port_arp":
+        return f"in_port={value},arp"
+    raise ValueError(f"未知 target 種類: {kind}")
+
+
+class RateLimiter:
+    """
+    管理限速中的 target 與 meter 配置
+
+    每個限速中的 target 狀態：
+        meter      : meter id（OVERFLOW_METER_ID 代表共用）
+        since      : 開始限速時間
+        last_hit   : 最後一次仍超標的時間
+        strikes    : 限速後連續超標的秒數
+    """
+
+    def __init__(self, switch, ofctl=OFCTL_CMD, run=_run,
+                 rate=RATE_PPS, burst=BURST_PKTS,
+                 lift_after=LIFT_AFTER, escalate_after=ESCALATE_AFTER,
+                 max_meters=MAX_METERS, max_new_per_event=MAX_NEW_PER_EVENT,
+                 max_overflow_flows=MAX_OVERFLOW_FLOWS, drop_timeout=DROP_TIMEOUT):
+        self.switch = switch
+        self.ofctl = list(ofctl)
+        self.run = run
+        self.rate = rate
+        self.burst = burst
+        self.lift_after = lift_after
+        self.escalate_after = escalate_after
+        self.max_overflow_flows = max_overflow_flows
+        self.max_new_per_event = max_new_per_event
+        self.drop_timeout = drop_timeout
+
+        self.free_meters = list(range(max_meters + 1, OVERFLOW_METER_ID, -1))
+        self.overflow_ready = False
+        self.overflow_count = 0
+        self.limited = {}
+        self.dropped = {}          # target -> drop flow 到期時間
+
+    # ----- ovs-ofctl -----
+
+    def _ofctl(self, *args):
+        return self.run(self.ofctl + [args[0], self.switch] + list(args[1:]))
+
+    def _add_meter(self, meter_id):
+        return self._ofctl(
+            "add-meter",
+            f"meter={meter_id},pktps,burst,"
+            f"band=type=drop,rate={self.rate},burst_size={self.burst}",
+        )
+
+    def _del_meter(self, meter_id):
+        return self._ofctl("del-meter", f"meter={meter_id}")
+
+    # ----- 限速 / 解除 / 升級 -----
+
+    def limit(self, targets, now=None):
+        """將 targets 放到 meter 後面；回傳本次新增限速的 target 列表"""
+        now = time.time() if now is None else now
+        added = []
+        new_meters = 0
+
+        for target in targets:
+            if target in self.limited or target in self.dropped:
+                continue
+
+            if new_meters < self.max_new_per_event and self.free_meters:
+                meter_id = self.free_meters.pop()
+                if not self._add_meter(meter_id):
+                    self.free_meters.append(meter_id)
+                    continue
+            elif self.overflow_count < self.max_overflow_flows:
+                if not self.overflow_ready:
+                    self.overflow_ready = self._add_meter(OVERFLOW_METER_ID)
+                    if not self.overflow_ready:
+                        continue
+                meter_id = OVERFLOW_METER_ID
+            else:
+                print(f"[mitigation] meter/flow 已達上限，略過: {target[1]}")
+                continue
+
+            ok = self._ofctl(
+                "add-flow",
+                f"priority={PRIO_LIMIT},{target_match(target)},"
+                f"actions=meter:{meter_id},NORMAL",
+            )
+            if not ok:
+                # flow 沒裝上：歸還 meter，不記錄為限速中
+                self._free_meter(meter_id)
+                continue
+
+            if meter_id == OVERFLOW_METER_ID:
+                self.overflow_count += 1
+            else:
+                new_meters += 1
+            self.limited[target] = {
+                "meter": meter_id,
+                "since": now,
+                "last_hit": now,
+                "strikes": 0,
+            }
+            added.append(target)
+            print(f"[mitigation] 🐢 限速 {target[0]} {target[1]} (meter {meter_id})")
+
+        return added
+
+    def _free_meter(self, meter_id):
+        """per-target meter 直接刪除；overflow meter 在沒有 flow 使用時才刪除"""
+        if meter_id == OVERFLOW_METER_ID:
+            if self.overflow_count == 0 and self.overflow_ready:
+                self._del_meter(OVERFLOW_METER_ID)
+                self.overflow_ready = False
+        else:
+            self._del_meter(meter_id)
+            self.free_meters.append(meter_id)
+
+    def _release(self, target):
+        state = self.limited.pop(target)
+        # --strict：只刪除限速 flow，不影響同 match 的 drop flow
+        self.run(self.ofctl + [
+            "--strict", "del-flows", self.switch,
+            f"priority={PRIO_LIMIT},{target_match(target)}",
+        ])
+        if state["meter"] == OVERFLOW_METER_ID:
+            self.overflow_count -= 1
+        self._free_meter(state["meter"])
+
+    def lift(self, target):
+        self._release(target)
+        print(f"[mitigation] ✅ 解除限速 {target[0]} {target[1]}")
+
+    def escalate(self, target, now=None):
+        now = time.time() if now is None else now
+        self._release(target)
+        self._ofctl(
+            "add-flow",
+            f"priority={PRIO_DROP},hard_timeout={self.drop_timeout},"
+            f"{target_match(target)},actions=drop",
+        )
+        self.dropped[target] = now + self.drop_timeout
+        print(f"[mitigation] 🚫 升級為 drop {target[0]} {target[1]}（{self.drop_timeout}s）")
+
+    def tick(self, offending, now=None):
+        """
+        每個視窗呼叫一次；offending 為本視窗仍超標的 target 集合
+
+        回傳 (lifted, escalated, expired)；expired 為 drop flow 已到期的 target
+        """
+        now = time.time() if now is None else now
+        lifted, escalated = [], []
+
+        expired = [t for t, until in self.dropped.items() if now >= until]
+        for target in expired:
+            # OVS 已依 hard_timeout 移除 flow，這裡只清掉狀態
+            del self.dropped[target]
+            print(f"[mitigation] ⏱ drop 到期 {target[0]} {target[1]}")
+
+        for target, state in list(self.limited.items()):
+            if target in offending:
+                state["last_hit"] = now
+                state["strikes"] += 1
+                if state["strikes"] >= self.escalate_after:
+                    self.escalate(target, now)
+                    escalated.append(target)
+            else:
+                state["strikes"] = 0
+                if now - state["last_hit"] >= self.lift_after:
+                    self.lift(target)
+                    lifted.append(target)
+
+        return lifted, escalated, expired
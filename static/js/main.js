@@ -8,6 +8,9 @@ let chart = null;
 let chartData = null;
 let prevStats = null;
 let lastAlertCount = 0;
+let alerts = [];
+let lastAlertId = null;   // /api/alerts?since= 的 cursor
+const MAX_ALERTS = 50;
 
 // ========== 初始化圖表 ==========
 function initChart() {
@@ -189,8 +192,30 @@ async function updateHistory() {
 // ========== 更新警報列表 ==========
 async function updateAlerts() {
     try {
-        const response = await fetch('/api/alerts');
-        const alerts = await response.json();
+        if (lastAlertId === null) {
+            // 初次載入：最近的警報（新到舊）
+            const response = await fetch(`/api/alerts?limit=${MAX_ALERTS}`);
+            alerts = await response.json();
+            lastAlertId = alerts.length > 0 ? alerts[0].id : 0;
+            if (lastAlertId === 0) {
+                // 沒有警報時以最新事件（可能是 CLEAR）作為 cursor
+                const latest = await (await fetch('/api/status')).json();
+                lastAlertId = latest.last_event_id || 0;
+            }
+        } else {
+            // 增量讀取：只取 cursor 之後的新事件（舊到新）
+            const response = await fetch(`/api/alerts?since=${lastAlertId}`);
+            const events = await response.json();
+            for (const event of events) {
+                lastAlertId = event.id;
+                if (event.type === 'CLEAR') {
+                    alerts = [];
+                } else {
+                    alerts.unshift(event);
+                }
+            }
+            alerts = alerts.slice(0, MAX_ALERTS);
+        }
         
         const alertsList = document.getElementById('alertsList');
         document.getElementById('alertCount').textContent = alerts.length;
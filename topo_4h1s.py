@@ -19,7 +19,9 @@ class FourHostOneSwitch(Topo):
 
     def build(self):
         # 關鍵：failMode='standalone'，沒有 controller 也會像一般交換機一樣轉封包
-        s1 = self.addSwitch('s1', cls=OVSSwitch, failMode='standalone')
+        # OpenFlow13：detector.py 的 ratelimit 模式需要 OVS meter
+        s1 = self.addSwitch('s1', cls=OVSSwitch, failMode='standalone',
+                            protocols='OpenFlow10,OpenFlow13')
 
         h1 = self.addHost('h1',
                           ip='10.0.0.1/24',
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+traffic_gen.py - 可重現的合成流量與標註資料集產生器
+
+取代 attack_arp_flood.sh + /tmp/attack_flag 的資料蒐集流程：
+    - 依固定 seed 產生封包，速率精確（每個區段 rate pkts/s）
+    - 支援 benign / burst / arp_flood / mac_flood 四種流量
+    - 每個 frame 都帶有 ground-truth label，區段邊界完全對齊
+    - 可輸出 pcap、與 collector.py 相同格式的 stats.csv、區段標註 JSON
+    - 不需要 root、不需要網路
+
+使用方式：
+    python3 traffic_gen.py --seed 1 --pcap gen.pcap --csv gen_stats.csv
+    python3 traffic_gen.py --scenario "benign:0:120:40,arp_flood:30:20:300" --csv gen_stats.csv
+"""
+
+import argparse
+import csv
+import heapq
+import json
+import random
+import struct
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from collector import forwarded_copies, learn_mac
+
+# ---------------- 基本設定 ----------------
+
+# 與 topo_4h1s.py 相同的主機設定
+HOSTS = [
+    ("00:00:00:00:00:01", "10.0.0.1"),
+    ("00:00:00:00:00:02", "10.0.0.2"),
+    ("00:00:00:00:00:03", "10.0.0.3"),
+    ("00:00:00:00:00:04", "10.0.0.4"),
+]
+ATTACKER = HOSTS[2]   # h3
+VICTIM = HOSTS[1]     # h2
+
+# 主機 MAC -> 所在的 switch port（hN 接在 s1-ethN）
+HOST_PORTS = {mac: f"s1-eth{i}" for i, (mac, _) in enumerate(HOSTS, 1)}
+
+BROADCAST_MAC = "ff:ff:ff:ff:ff:ff"
+
+ETH_TYPE_IPV4 = 0x0800
+ETH_TYPE_ARP = 0x0806
+
+# label：0 = 正常，1 = ARP Flood，2 = MAC Flood
+TRAFFIC_KINDS = {
+    "benign": 0,
+    "burst": 0,
+    "arp_flood": 1,
+    "mac_flood": 2,
+}
+
+# 正常流量中 ARP 封包的比例（每 N 個封包一個 ARP request）
+BENIGN_ARP_EVERY = 25
+
+# 預設情境：kind, start(s), duration(s), rate(pkts/s)
+DEFAULT_SCENARIO = [
+    ("benign", 0, 300, 40),
+    ("burst", 60, 30, 400),
+    ("arp_flood", 120, 30, 300),
+    ("mac_flood", 200, 30, 200),
+    ("burst", 250, 10, 600),
+    ("arp_flood", 260, 10, 150),
+]
+
+US_PER_SEC = 1_000_000
+
+CSV_HEADER = [
+    "timestamp_epoch",
+    "timestamp_readable",
+    "total_pkts",
+    "arp_pkts",
+    "unique_src_macs",
+    "arp_ratio",
+    "label",
+    "capture_status",
+    "capture_coverage",
+]
+
+
+# ---------------- 封包組裝 ----------------
+
+def mac_to_bytes(mac):
+    return bytes(int(x, 16) for x in mac.split(":"))
+
+
+def ip_to_bytes(ip):
+    return bytes(int(x) for x in ip.split("."))
+
+
+def random_mac(rng):
+    """隨機單播、locally administered MAC"""
+    first = (rng.randrange(256) & 0xFC) | 0x02
+    rest = [rng.randrange(256) for _ in range(5)]
+    return ":".join(f"{b:02x}" for b in [first] + rest)
+
+
+def build_arp_request(src_mac, src_ip, dst_ip):
+    eth = mac_to_bytes(BROADCAST_MAC) + mac_to_bytes(src_mac) + struct.pack("!H", ETH_TYPE_ARP)
+    arp = struct.pack("!HHBBH", 1, ETH_TYPE_IPV4, 6, 4, 1)
+    arp += mac_to_bytes(src_mac) + ip_to_bytes(src_ip)
+    arp += b"\x00" * 6 + ip_to_bytes(dst_ip)
+    return (eth + arp).ljust(60, b"\x00")
+
+
+def build_udp(src_mac, dst_mac, src_ip, dst_ip, sport, dport, payload_len):
+    payload = b"\x00" * payload_len
+    udp = struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+    total_len = 20 + len(udp)
+    ip_hdr = struct.pack(
+        "!BBHHHBBH4s4s",
+        0x45, 0, total_len, 0, 0, 64, 17, 0,
+        ip_to_bytes(src_ip), ip_to_bytes(dst_ip),
+    )
+    csum = ip_checksum(ip_hdr)
+    ip_hdr = ip_hdr[:10] + struct.pack("!H", csum) + ip_hdr[12:]
+    eth = mac_to_bytes(dst_mac) + mac_to_bytes(src_mac) + struct.pack("!H", ETH_TYPE_IPV4)
+    return (eth + ip_hdr + udp).ljust(60, b"\x00")
+
+
+def ip_checksum(header):
+    s = 0
+    for i in range(0, len(header), 2):
+        s += (header[i] << 8) + header[i + 1]
+    while s >> 16:
+        s = (s & 0xFFFF) + (s >> 16)
+    return ~s & 0xFFFF
+
+
+def frame_src_mac(frame):
+    return ":".join(f"{b:02x}" for b in frame[6:12])
+
+
+def frame_dst_mac(frame):
+    return ":".join(f"{b:02x}" for b in frame[0:6])
+
+
+def ingress_port(src_mac):
+    """frame 進入 switch 的 port；MAC Flood 的隨機來源 MAC 都由攻擊者送出"""
+    return HOST_PORTS.get(src_mac, HOST_PORTS[ATTACKER[0]])
+
+
+def frame_is_arp(frame):
+    return struct.unpack("!H", frame[12:14])[0] == ETH_TYPE_ARP
+
+
+# ---------------- 流量產生 ----------------
+
+def make_frame(kind, rng, i):
+    """依流量種類產生第 i 個 frame"""
+    if kind == "arp_flood":
+        target = f"10.0.0.{rng.randrange(1, 255)}" if i % 2 else VICTIM[1]
+        return build_arp_request(ATTACKER[0], ATTACKER[1], target)
+
+    if kind == "mac_flood":
+        dst_mac, dst_ip = rng.choice(HOSTS)
+        return build_udp(random_mac(rng), dst_mac, "10.0.0.3", dst_ip,
+                         rng.randrange(1024, 65536), rng.randrange(1, 1024), 18)
+
+    src, dst = rng.sample(HOSTS, 2)
+    if kind == "benign" and i % BENIGN_ARP_EVERY == BENIGN_ARP_EVERY - 1:
+        return build_arp_request(src[0], src[1], dst[1])
+
+    payload_len = 18 if kind == "benign" else rng.choice([18, 512, 1400])
+    return build_udp(src[0], dst[0], src[1], dst[1],
+                     rng.randrange(1024, 65536), 5001, payload_len)
+
+
+def segment_frames(index, segment, seed, t0_us):
+    """
+    產生單一區段的 frame，時間間隔固定 -> 速率精確
+
+    回傳 (ts_us, index, seq, kind, label, frame)，index/seq 用來讓合併排序穩定
+    """
+    kind, start, duration, rate = segment
+    label = TRAFFIC_KINDS[kind]
+    # 每個區段各自的 RNG：增減其他區段不影響本區段內容
+    rng = random.Random(f"{seed}:{index}:{kind}")
+    start_us = t0_us + int(start * US_PER_SEC)
+    count = int(rate * duration)
+    for i in range(count):
+        ts_us = start_us + (i * US_PER_SEC) // rate
+        yield (ts_us, index, i, kind, label, make_frame(kind, rng, i))
+
+
+def generate_frames(scenario=None, seed=0, t0=None):
+    """
+    in-memory frame stream（依時間排序）
+
+    每個元素：(ts_us, kind, label, frame_bytes)
+    """
+    scenario = DEFAULT_SCENARIO if scenario is None else scenario
+    t0 = int(time.time()) if t0 is None else int(t0)
+    streams = [
+        segment_frames(idx, seg, seed, t0 * US_PER_SEC)
+        for idx, seg in enumerate(scenario)
+    ]
+    for ts_us, _, _, kind, label, frame in heapq.merge(*streams):
+        yield ts_us, kind, label, frame
+
+
+def ground_truth(scenario=None, t0=0):
+    """每個區段的精確時間區間（epoch 秒，左閉右開）"""
+    scenario = DEFAULT_SCENARIO if scenario is None else scenario
+    return [
+        {
+            "kind": kind,
+            "label": TRAFFIC_KINDS[kind],
+            "start": t0 + start,
+            "end": t0 + start + duration,
+            "rate": rate,
+        }
+        for kind, start, duration, rate in scenario
+    ]
+
+
+def parse_scenario(text):
+    """解析 "kind:start:duration:rate,..." 格式"""
+    scenario = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        parts = item.split(":")
+        if len(parts) != 4:
+            raise ValueError(f"區段格式錯誤: {item}（需為 kind:start:duration:rate）")
+        kind, start, duration, rate = parts
+        if kind not in TRAFFIC_KINDS:
+            raise ValueError(f"未知流量種類: {kind}")
+        rate = int(rate)
+        if rate <= 0:
+            raise ValueError(f"rate 必須 > 0: {item}")
+        scenario.append((kind, float(start), float(duration), rate))
+    return scenario
+
+
+# ---------------- 輸出 ----------------
+
+def write_pcap(path, frames):
+    """寫入 pcap（LINKTYPE_ETHERNET, microsecond）；回傳封包數"""
+    count = 0
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for ts_us, _, _, frame in frames:
+            sec, usec = divmod(ts_us, US_PER_SEC)
+            f.write(struct.pack("<IIII", sec, usec, len(frame), len(frame)))
+            f.write(frame)
+            count += 1
+    return count
+
+
+def window_stats(frames):
+    """
+    依每秒統計，欄位與計數方式都與 collector.py 的 stats.csv 相同：
+    每個 frame 在 ingress port 計一次，再加上 switch 轉送出去的副本
+    （以 collector 的 MAC learning 模擬，broadcast ARP 約 4 倍）
+
+    window label 取該秒內最大的 frame label（有攻擊封包即標記為攻擊）
+    """
+    table = OrderedDict()
+    current = None
+    for ts_us, _, label, frame in frames:
+        sec = ts_us // US_PER_SEC
+        if current is not None and sec != current["timestamp_epoch"]:
+            yield from _flush_windows(current, sec)
+            current = None
+        if current is None:
+            current = _empty_window(sec)
+
+        src_mac = frame_src_mac(frame)
+        port = ingress_port(src_mac)
+        copies = 1 + forwarded_copies(frame_dst_mac(frame), port, table, len(HOST_PORTS))
+        learn_mac(src_mac, port, table)
+
+        current["total_pkts"] += copies
+        if frame_is_arp(frame):
+            current["arp_pkts"] += copies
+        current["src_macs"].add(src_mac)
+        current["label"] = max(current["label"], label)
+    if current is not None:
+        yield from _flush_windows(current, None)
+
+
+def _empty_window(sec):
+    return {
+        "timestamp_epoch": sec,
+        "total_pkts": 0,
+        "arp_pkts": 0,
+        "src_macs": set(),
+        "label": 0,
+    }
+
+
+def _flush_windows(window, next_sec):
+    yield _window_row(window)
+    # 沒有封包的秒數也要輸出（collector 每秒都會寫一列）
+    if next_sec is not None:
+        for sec in range(window["timestamp_epoch"] + 1, next_sec):
+            yield _window_row(_empty_window(sec))
+
+
+def _window_row(window):
+    total = window["total_pkts"]
+    arp_ratio = window["arp_pkts"] / total if total > 0 else 0
+    return [
+        window["timestamp_epoch"],
+        datetime.fromtimestamp(window["timestamp_epoch"]).strftime("%Y-%m-%d %H:%M:%S"),
+        total,
+        window["arp_pkts"],
+        len(window["src_macs"]),
+        round(arp_ratio, 4),
+        window["label"],
+        "ok",
+        1.0,
+    ]
+
+
+def write_stats_csv(path, frames):
+    """寫入與 collector.py 相同格式的 stats.csv；回傳列數"""
+    rows = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for row in window_stats(frames):
+            writer.writerow(row)
+            rows += 1
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成流量與標註資料集產生器")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--t0", type=int, default=None, help="起始 epoch 秒（預設為現在）")
+    parser.add_argument("--scenario", default=None,
+                        help='區段列表 "kind:start:duration:rate,..."')
+    parser.add_argument("--pcap", default=None, help="輸出 pcap 路徑")
+    parser.add_argument("--csv", default=None, help="輸出 stats.csv 格式路徑")
+    parser.add_argument("--truth", default=None, help="輸出區段標註 JSON 路徑")
+    args = parser.parse_args()
+
+    scenario = parse_scenario(args.scenario) if args.scenario else DEFAULT_SCENARIO
+    t0 = int(time.time()) if args.t0 is None else args.t0
+
+    if not (args.pcap or args.csv or args.truth):
+        parser.error("至少需指定 --pcap / --csv / --truth 其中之一")
+
+    if args.pcap:
+        n = write_pcap(args.pcap, generate_frames(scenario, args.seed, t0))
+        print(f"✅ {args.pcap}: {n} packets")
+
+    if args.csv:
+        n = write_stats_csv(args.csv, generate_frames(scenario, args.seed, t0))
+        print(f"✅ {args.csv}: {n} windows")
+
+    if args.truth:
+        with open(args.truth, "w") as f:
+            json.dump({
+                "seed": args.seed,
+                "t0": t0,
+                "intervals": ground_truth(scenario, t0),
+            }, f, indent=2)
+        print(f"✅ {args.truth}")
+
+
+if __name__ == "__main__":
+    main()